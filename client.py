@@ -3,7 +3,12 @@ import argparse
 import sys
 import time
 import random
-from rudp_simulation import RUDPPacket, NetworkSimulator, SimulationVisualizer, print_simulation_header
+import selectors
+import heapq
+import queue
+import threading
+from rudp_batch import send_batch, send_gso, BatchReceiver
+from rudp_simulation import RUDPPacket, NetworkSimulator, SimulationVisualizer, print_simulation_header, tune_socket, flush_logs, SOCKET_BUFFER_SIZE, WINDOW_SIZE
 
 class RUDPClient:
     """RUDP Client implementation using real sockets"""
@@ -11,140 +16,249 @@ class RUDPClient:
     def __init__(self, server_host="127.0.0.1", server_port=5000,
                  loss_rate=0.2, corruption_rate=0.1,
                  delay_min=0.05, delay_max=0.2,
-                 timeout=1.0, max_retries=3):
+                 timeout=1.0, max_retries=3, window_size=WINDOW_SIZE, gso=False,
+                 rcvbuf=SOCKET_BUFFER_SIZE, sndbuf=SOCKET_BUFFER_SIZE, verbose=True):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        
         self.server_address = (server_host, server_port)
         
         # Create a UDP socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.settimeout(timeout)
+        buffer_sizes = tune_socket(self.socket, rcvbuf, sndbuf)
+        
+        # Poll a non-blocking socket through a persistent selector instead of
+        # arming a socket timeout on every receive
+        self.socket.setblocking(False)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self.socket, selectors.EVENT_READ)
+        
+        # Connect to the server once so each send skips the address lookup
+        self.socket.connect(self.server_address)
         
         # Setup network simulator for artificial conditions
         self.network = NetworkSimulator(loss_rate, corruption_rate, delay_min, delay_max)
         self.visualizer = SimulationVisualizer()
+        self.visualizer.log_info("Socket buffers: SO_RCVBUF=%d, SO_SNDBUF=%d" % buffer_sizes)
         
         # Client state
         self.next_sequence = 0
         self.timeout = timeout
         self.max_retries = max_retries
+        self.window_size = window_size
+        self.verbose = verbose  # Log every packet, not just progress and results
+        
+        # Coalesce due packets into UDP_SEGMENT sends instead of sendmmsg
+        self._send = send_gso if gso else send_batch
+        
+        # Packets delayed by the simulated network, as a min-heap of
+        # (due_time, sequence, packet_bytes)
+        self._in_transit = []
+        
+        # Upper bound for the exponentially backed-off retransmission timeout
+        self.max_backoff = timeout * 8
+        
+        # Receive ACKs on a background thread so they are never held up by the sender
+        self._ack_q = queue.Queue()
+        self._receiver = BatchReceiver(self.socket)
+        self._reading = True
+        self._reader_thread = threading.Thread(target=self._ack_reader, daemon=True)
+        self._reader_thread.start()
+    
+    def _ack_reader(self):
+        """Receive packets from the server and queue them for the sender"""
+        while self._reading:
+            try:
+                if self._sel.select(0.1):
+                    for data, server_address in self._receiver.recv():
+                        self._ack_q.put(RUDPPacket.from_bytes(data))
+            except (ConnectionResetError, ConnectionRefusedError) as e:
+                self.visualizer.log_info(f"Connection error: {str(e)}. The server might have closed.")
+            except (OSError, ValueError):
+                break  # Socket was closed
+    
+    def _retransmit_timeout(self, retries):
+        """Get the jittered, backed-off retransmission timeout for a packet"""
+        # Jitter only lengthens the wait, so no timer fires before the configured timeout;
+        # clamping after it keeps max_backoff a true upper bound
+        return min(self.max_backoff, self.timeout * (2 ** retries) * random.uniform(1.0, 1.5))
     
     def send_message(self, message):
         """Send a message reliably using RUDP"""
         self.visualizer.log_info(f"Sending message to {self.server_address[0]}:{self.server_address[1]}")
         
-        # First check if server is reachable
-        try:
-            # Send a quick ping packet to check if server is available
-            ping_packet = RUDPPacket(sequence=0, data="PING")
-            self.socket.sendto(ping_packet.to_json().encode(), self.server_address)
-            self.visualizer.log_info("Checking if server is available...")
-            
-            try:
-                # Wait for a response with a short timeout
-                json_data, server_address = self.socket.recvfrom(1024)
-                self.visualizer.log_info("Server is reachable, proceeding with message transmission")
-            except socket.timeout:
-                self.visualizer.log_info("Server did not respond to initial ping. Make sure server is running.")
-                return False
-            except Exception as e:
-                self.visualizer.log_info(f"Error connecting to server: {str(e)}")
-                return False
-        except Exception as e:
-            self.visualizer.log_info(f"Error sending ping to server: {str(e)}")
-            return False
-        
-        # Break message into chunks
+        # Break message into chunks sliced lazily from the encoded bytes
         chunk_size = 5  # Small size for demonstration
-        chunks = [message[i:i+chunk_size] for i in range(0, len(message), chunk_size)]
+        payload = memoryview(message.encode("utf-8"))
         
         start_time = time.time()
         
-        for chunk in chunks:
-            # Create packet
-            packet = RUDPPacket(sequence=self.next_sequence, data=chunk)
-            retries = 0
-            sent = False
+        # Selective Repeat sender state, keyed by sequence number
+        base = self.next_sequence
+        next_seq = self.next_sequence
+        end_seq = self.next_sequence + (len(payload) + chunk_size - 1) // chunk_size
+        unacked_packet = {}
+        expires = {}  # Retransmission deadline, drawn once per send so the jitter holds
+        retries = {}
+        sends = 0
+        replies = 0
+        self._in_transit.clear()
+        
+        # Bind hot-loop lookups to local names once
+        monotonic = time.monotonic
+        wall_time = time.time
+        transmit = self._transmit
+        dispatch_due = self._dispatch_due
+        ack_get = self._ack_q.get
+        ack_get_nowait = self._ack_q.get_nowait
+        retransmit_timeout = self._retransmit_timeout
+        decide = self.network.decide
+        log_received = self.visualizer.log_received_packet
+        log_dropped = self.visualizer.log_dropped_packet
+        verbose = self.verbose
+        in_transit = self._in_transit
+        window_size = self.window_size
+        first_seq = self.next_sequence
+        
+        while base < end_seq:
+            # Fill the send window with new packets, reading the clocks once for all of them
+            if next_seq < base + window_size and next_seq < end_seq:
+                stamp, sent_at = wall_time(), monotonic()
+            while next_seq < base + window_size and next_seq < end_seq:
+                offset = (next_seq - first_seq) * chunk_size
+                # Zero-copy slice of the encoded message; checksum and packing read it in place
+                packet = RUDPPacket(sequence=next_seq, data=payload[offset:offset + chunk_size], timestamp=stamp)
+                unacked_packet[next_seq] = packet
+                retries[next_seq] = 0
+                transmit(packet, sent_at)
+                sends += 1
+                expires[next_seq] = sent_at + retransmit_timeout(0)
+                next_seq += 1
             
-            while not sent and retries < self.max_retries:
-                try:
-                    # Simulate packet loss
-                    if self.network.should_drop_packet():
-                        self.visualizer.log_sent_packet("CLIENT", packet, is_retransmission=(retries > 0))
-                        self.visualizer.log_dropped_packet(packet)
-                        retries += 1
-                        time.sleep(self.timeout / 2)  # Wait a bit less than the full timeout
-                        continue
-                    
-                    # Simulate network delay
-                    delay = self.network.get_delay()
-                    time.sleep(delay)
-                    
-                    # Simulate corruption
-                    if self.network.should_corrupt_packet():
-                        # Corrupt the packet
-                        corrupted_packet = RUDPPacket(sequence=packet.sequence, data=packet.data)
-                        corrupted_packet.checksum = random.randint(0, 65535)  # Set invalid checksum
-                        self.visualizer.log_sent_packet("CLIENT", corrupted_packet, is_retransmission=(retries > 0))
-                        try:
-                            self.socket.sendto(corrupted_packet.to_json().encode(), self.server_address)
-                        except Exception as e:
-                            self.visualizer.log_info(f"Error sending corrupted packet: {str(e)}")
-                        retries += 1
-                        time.sleep(self.timeout / 2)
-                        continue
-                    
-                    # Log sent packet
-                    self.visualizer.log_sent_packet("CLIENT", packet, is_retransmission=(retries > 0))
-                    
-                    # Send the packet
-                    self.socket.sendto(packet.to_json().encode(), self.server_address)
-                    
-                    # Wait for ACK
-                    try:
-                        json_data, server_address = self.socket.recvfrom(1024)
-                        
-                        # Simulate packet loss for ACK (server to client)
-                        if self.network.should_drop_packet():
-                            ack_packet = RUDPPacket.from_json(json_data.decode())
-                            self.visualizer.log_dropped_packet(ack_packet)
-                            retries += 1
-                            continue
-                        
-                        # Process the ACK
-                        ack_packet = RUDPPacket.from_json(json_data.decode())
-                        
-                        # Log received ACK
-                        self.visualizer.log_received_packet("CLIENT", ack_packet)
-                        
-                        # Verify this is the ACK we're expecting
-                        if ack_packet.is_ack and ack_packet.ack_number == self.next_sequence:
-                            self.next_sequence += 1
-                            sent = True
-                        else:
-                            self.visualizer.log_info(f"Unexpected ACK number: {ack_packet.ack_number}, expected: {self.next_sequence}")
+            # Hand over packets whose simulated network delay has elapsed
+            dispatch_due()
+            
+            # Wait for an ACK until the earliest retransmission or dispatch deadline
+            deadline = min(expires.values())
+            if in_transit:
+                deadline = min(deadline, in_transit[0][0])
+            try:
+                ack_packet = ack_get(timeout=max(0.0, deadline - monotonic()))
+            except queue.Empty:
+                ack_packet = None
+            
+            # Handle every ACK already queued before recomputing deadlines
+            while ack_packet is not None:
+                # The server answers each data packet at most once, so more
+                # replies than sends can only come from a misbehaving peer.
+                # Late ACKs for an earlier message are not counted.
+                if not ack_packet.is_ack or ack_packet.ack_number >= first_seq:
+                    replies += 1
+                if replies > sends:
+                    self.visualizer.log_info(f"Giving up after {replies} replies to {sends} packets sent")
+                    return False
+                
+                # Simulate packet loss for ACK (server to client)
+                if decide()[0]:
+                    if verbose:
+                        log_dropped(ack_packet)
+                else:
+                    # Log received ACK
+                    if verbose:
+                        log_received("CLIENT", ack_packet)
                     
-                    except socket.timeout:
-                        self.visualizer.log_timeout("CLIENT", packet.sequence)
-                        retries += 1
-                        continue
+                    # Only ACKs for packets still in flight advance the window;
+                    # a cumulative ACK covers every packet up to its number
+                    if not ack_packet.is_ack:
+                        acked = ()
+                    elif ack_packet.cumulative:
+                        acked = [s for s in unacked_packet if s <= ack_packet.ack_number]
+                    elif ack_packet.ack_number in unacked_packet:
+                        acked = (ack_packet.ack_number,)
+                    else:
+                        acked = ()
                     
-                except ConnectionResetError:
-                    self.visualizer.log_info("Connection was reset by the server. The server might have closed.")
-                    retries += 1
-                    time.sleep(0.5)  # Wait a bit before retrying
-                except Exception as e:
-                    self.visualizer.log_info(f"Error during transmission: {str(e)}")
-                    retries += 1
+                    if acked:
+                        for seq in acked:
+                            del unacked_packet[seq]
+                            del expires[seq]
+                            del retries[seq]
+                        while base < next_seq and base not in unacked_packet:
+                            base += 1
+                    elif verbose:
+                        self.visualizer.log_info(f"Unexpected ACK number: {ack_packet.ack_number}, window: {base}-{next_seq - 1}")
+                
+                try:
+                    ack_packet = ack_get_nowait()
+                except queue.Empty:
+                    ack_packet = None
             
-            if not sent:
-                self.visualizer.log_info(f"Failed to send chunk '{chunk}' after {self.max_retries} retries")
-                return False
+            # Retransmit each timed out packet individually
+            now = monotonic()
+            for seq in [s for s in unacked_packet if now >= expires[s]]:
+                if verbose:
+                    self.visualizer.log_timeout("CLIENT", seq)
+                retries[seq] += 1
+                if retries[seq] >= self.max_retries:
+                    # No reply at all means nothing ever reached the server
+                    if replies == 0:
+                        self.visualizer.log_info("Server did not respond. Make sure server is running.")
+                    self.visualizer.log_info(f"Failed to send chunk '{str(unacked_packet[seq].data, 'utf-8', 'replace')}' after {self.max_retries} retries")
+                    return False
+                unacked_packet[seq].refresh_timestamp()
+                transmit(unacked_packet[seq], now, is_retransmission=True)
+                sends += 1
+                expires[seq] = now + retransmit_timeout(retries[seq])
         
+        self.next_sequence = end_seq
         end_time = time.time()
         self.visualizer.log_info(f"Message sent successfully. Total time: {end_time - start_time:.2f} seconds")
         return True
     
+    def _transmit(self, packet, now, is_retransmission=False):
+        """Send a packet through the simulated network, timing any delay from the caller's clock read"""
+        drop, corrupt, delay = self.network.decide()
+        
+        # Simulate packet loss; the retransmission timer recovers it
+        if drop:
+            if self.verbose:
+                self.visualizer.log_sent_packet("CLIENT", packet, is_retransmission)
+                self.visualizer.log_dropped_packet(packet)
+            return
+        
+        # Simulate network delay; the packet is handed to the socket once due
+        due = now + delay
+        
+        # Simulate corruption by flipping a checksum bit in the outgoing bytes only
+        if corrupt:
+            data = packet.to_corrupted_bytes()
+        else:
+            data = packet.to_bytes()
+        
+        # Log sent packet
+        if self.verbose:
+            self.visualizer.log_sent_packet("CLIENT", packet, is_retransmission)
+        
+        heapq.heappush(self._in_transit, (due, packet.sequence, data))
+    
+    def _dispatch_due(self):
+        """Send every delayed packet whose simulated network delay has elapsed"""
+        now = time.monotonic()
+        due = []
+        while self._in_transit and self._in_transit[0][0] <= now:
+            due.append(heapq.heappop(self._in_transit)[2])
+        
+        # Flush the whole batch with a single syscall where supported
+        try:
+            self._send(self.socket, due)
+        except Exception as e:
+            self.visualizer.log_info(f"Error during transmission: {str(e)}")
+    
     def close(self):
-        """Close the socket"""
+        """Stop the ACK reader and close the socket"""
+        self._reading = False
+        self._reader_thread.join()
+        self._sel.close()
         self.socket.close()
 
 
@@ -159,8 +273,20 @@ def main():
     parser.add_argument("--delay-max", type=float, default=0.2, help="Maximum network delay in seconds")
     parser.add_argument("--timeout", type=float, default=1.0, help="Timeout for ACK in seconds")
     parser.add_argument("--retries", type=int, default=3, help="Maximum retransmission attempts")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE,
+                        help="Selective Repeat send window size; must not exceed the server's --window")
+    parser.add_argument("--gso", action="store_true", help="Send with UDP generic segmentation offload (Linux)")
+    parser.add_argument("--quiet", dest="verbose", action="store_false",
+                        help="Only log progress and results, not every packet")
+    parser.add_argument("--rcvbuf", type=int, default=SOCKET_BUFFER_SIZE, help="Socket receive buffer size in bytes")
+    parser.add_argument("--sndbuf", type=int, default=SOCKET_BUFFER_SIZE, help="Socket send buffer size in bytes")
     
     args = parser.parse_args()
+    if args.window < 1:
+        parser.error("--window must be at least 1")
+    if args.window > WINDOW_SIZE:
+        print(f"Warning: --window {args.window} is larger than the server's default of {WINDOW_SIZE}; "
+              f"start the server with --window {args.window} or more, or packets beyond its window will time out")
     
     # Print simulation parameters
     print_simulation_header(args)
@@ -175,16 +301,23 @@ def main():
         delay_min=args.delay_min,
         delay_max=args.delay_max,
         timeout=args.timeout,
-        max_retries=args.retries
+        max_retries=args.retries,
+        window_size=args.window,
+        gso=args.gso,
+        rcvbuf=args.rcvbuf,
+        sndbuf=args.sndbuf,
+        verbose=args.verbose
     )
     
     try:
         success = client.send_message(args.message)
+        flush_logs()
         if success:
             print(f"\nMessage sent successfully")
         else:
             print(f"\nFailed to send message. Please check if the server is running.")
     except KeyboardInterrupt:
+        flush_logs()
         print(f"\nClient interrupted by user")
     finally:
         client.close()
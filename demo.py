@@ -1,80 +1,145 @@
 import socket
-import json
 import time
+import struct
+import zlib
+import functools
 import random
+import atexit
+import selectors
+import heapq
 import argparse
 import sys
 import threading
-from datetime import datetime
+import queue
+import itertools
 from colorama import Fore, Style, init
 
 # Initialize colorama for cross-platform colored terminal output
 init()
 
+# Binary wire formats, dispatched on the leading packet type byte:
+# data packets carry type, sequence, checksum, payload length, timestamp and
+# the payload, ACKs carry only type and the acknowledged sequence number.
+# A cumulative ACK acknowledges every sequence number up to its own.
+_TYPE_DATA = 0x00
+_TYPE_ACK = 0x01
+_TYPE_CUMULATIVE_ACK = 0x02
+_HDR = struct.Struct("!BIHHd")
+_ACK = struct.Struct("!BI")
+# Offset of the timestamp field within the header, patched in place on retransmit
+_TS_OFFSET = struct.calcsize("!BIHH")
+_TS = struct.Struct("!d")
+_CHECKSUM_OFFSET = struct.calcsize("!BI")
+
+
+@functools.lru_cache(maxsize=4096)
+def _ack_bytes(sequence, cumulative=False):
+    """Wire format of the ACK for a sequence number, packed once per sequence"""
+    return _ACK.pack(_TYPE_CUMULATIVE_ACK if cumulative else _TYPE_ACK, sequence)
+
+
+def _pack_data(sequence, checksum, timestamp, data):
+    """Wire format of a data packet, as a bytearray whose timestamp can be patched in place"""
+    buf = bytearray(_HDR.size + len(data))
+    _HDR.pack_into(buf, 0, _TYPE_DATA, sequence, checksum, len(data), timestamp)
+    buf[_HDR.size:] = data
+    return buf
+
+
+# Kernel socket buffer size, large enough to absorb bursts of retransmissions
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Linux values, for Python versions whose socket module does not export them
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+IP_PMTUDISC_DONT = getattr(socket, "IP_PMTUDISC_DONT", 0)
+
 class RUDPPacket:
     """Class representing a RUDP packet"""
     
-    def __init__(self, sequence=0, data="", is_ack=False, ack_number=None):
+    # Fixed attribute layout instead of a per-instance __dict__
+    __slots__ = ("sequence", "data", "is_ack", "ack_number", "cumulative", "checksum",
+                 "timestamp", "is_corrupted", "packet_type", "_buf")
+    
+    def __init__(self, sequence=0, data=b"", is_ack=False, ack_number=None, cumulative=False,
+                 timestamp=None):
         self.sequence = sequence
         self.data = data
         self.is_ack = is_ack
         self.ack_number = ack_number
+        self.cumulative = cumulative
         self.checksum = self._calculate_checksum(data) if not is_ack else 0
-        self.timestamp = time.time()
+        # Callers building several packets at once can share one clock read
+        if timestamp is None:
+            timestamp = time.time() if not is_ack else 0.0  # ACKs carry no timestamp
+        self.timestamp = timestamp
         self.is_corrupted = False
+        self.packet_type = (_TYPE_CUMULATIVE_ACK if cumulative else _TYPE_ACK) if is_ack else _TYPE_DATA
+        self._buf = None
     
-    def to_json(self):
-        """Convert packet to JSON"""
-        packet_dict = {
-            "sequence": self.sequence,
-            "is_ack": self.is_ack,
-            "checksum": self.checksum,
-            "timestamp": self.timestamp
-        }
-        
+    def to_bytes(self):
+        """Convert packet to its binary wire format"""
         if self.is_ack:
-            packet_dict["ack_number"] = self.ack_number
-        else:
-            packet_dict["data"] = self.data
-            
-        return json.dumps(packet_dict)
+            return _ack_bytes(self.ack_number, self.cumulative)
+        
+        # Materialize the wire bytes once; retransmits only patch the timestamp
+        if self._buf is None:
+            self._buf = _pack_data(self.sequence, self.checksum, self.timestamp, self.data)
+        return bytes(self._buf)
+    
+    def refresh_timestamp(self):
+        """Restamp the packet for retransmission"""
+        self.timestamp = time.time()
+        if self._buf is not None:
+            _TS.pack_into(self._buf, _TS_OFFSET, self.timestamp)
+    
+    def to_corrupted_bytes(self):
+        """Wire format with one checksum bit flipped, leaving the packet intact"""
+        buf = bytearray(self.to_bytes())
+        buf[_CHECKSUM_OFFSET] ^= 1
+        return bytes(buf)
     
     @staticmethod
-    def from_json(json_str):
-        """Create packet from JSON string"""
+    def from_bytes(buf):
+        """Create packet from its binary wire format, copying only the payload"""
+        # Every slot is assigned below, so skip __init__ and its checksum and clock read
+        packet = RUDPPacket.__new__(RUDPPacket)
+        packet.sequence = 0
+        packet.data = b""
+        packet.is_ack = False
+        packet.ack_number = None
+        packet.cumulative = False
+        packet.checksum = 0
+        packet.timestamp = 0.0
+        packet.is_corrupted = False
+        packet.packet_type = _TYPE_DATA
+        packet._buf = None
         try:
-            packet_dict = json.loads(json_str)
-            packet = RUDPPacket()
-            packet.sequence = packet_dict.get("sequence", 0)
-            packet.is_ack = packet_dict.get("is_ack", False)
-            packet.checksum = packet_dict.get("checksum", 0)
-            packet.timestamp = packet_dict.get("timestamp", time.time())
+            packet.packet_type = buf[0]  # Kept raw so receivers can reject unknown types
+            if buf[0] == _TYPE_ACK or buf[0] == _TYPE_CUMULATIVE_ACK:
+                _, packet.ack_number = _ACK.unpack_from(buf, 0)
+                packet.is_ack = True
+                packet.cumulative = buf[0] == _TYPE_CUMULATIVE_ACK
+                return packet
             
-            if packet.is_ack:
-                packet.ack_number = packet_dict.get("ack_number")
-                packet.data = ""
-            else:
-                packet.data = packet_dict.get("data", "")
-                packet.ack_number = None
-                
-            return packet
-        except json.JSONDecodeError:
-            # Return a corrupted packet indicator
-            packet = RUDPPacket()
+            _, sequence, checksum, data_len, timestamp = _HDR.unpack_from(buf, 0)
+            if len(buf) < _HDR.size + data_len:
+                raise struct.error("truncated payload")
+            
+            # Verify the checksum while parsing, over the payload still in the receive buffer
+            payload = buf[_HDR.size:_HDR.size + data_len]
+            packet.sequence = sequence
+            packet.data = bytes(payload)
+            packet.checksum = checksum
+            packet.timestamp = timestamp
+            packet.is_corrupted = zlib.crc32(payload) & 0xFFFF != checksum
+        except (struct.error, IndexError):
+            # Mark the packet as a corrupted packet indicator
             packet.is_corrupted = True
-            return packet
+        return packet
     
     def _calculate_checksum(self, data):
-        """Calculate a simple checksum for the data"""
-        return sum(ord(c) for c in data) % 65536
-    
-    def verify_checksum(self):
-        """Verify the integrity of the packet"""
-        if self.is_ack:
-            return True  # ACKs don't need checksum verification
-            
-        calculated_checksum = self._calculate_checksum(self.data)
-        return calculated_checksum == self.checksum
+        """Calculate a 16-bit CRC-32 based checksum for the data"""
+        return zlib.crc32(data) & 0xFFFF
 
 
 class NetworkSimulator:
@@ -86,17 +151,129 @@ class NetworkSimulator:
         self.delay_min = delay_min
         self.delay_max = delay_max
         
-    def should_drop_packet(self):
-        """Determine if a packet should be dropped"""
-        return random.random() < self.loss_rate
+        # Private generator, so draws skip the module-level random wrappers
+        self._rng = random.Random()
+        
+        # Pre-drawn decisions, refilled a block at a time once they run out
+        self._decisions = iter(())
+    
+    # Number of decisions drawn each time the pre-drawn ones run out
+    DRAW_BLOCK = 4096
+    
+    def _draw_decisions(self, n):
+        """Draw n (drop, corrupt, delay) decisions, each from one 64-bit random value
+        
+        The low 24 bits decide loss, the next 24 corruption and the top 16 bits
+        pick the delay, so the three fields are independent.
+        """
+        getrandbits = self._rng.getrandbits
+        drop_thr = int(self.loss_rate * 0x1000000)
+        corrupt_thr = int(self.corruption_rate * 0x1000000)
+        low, step = self.delay_min, (self.delay_max - self.delay_min) / 0xFFFF
+        decisions = []
+        for _ in range(n):
+            r = getrandbits(64)
+            decisions.append(((r & 0xFFFFFF) < drop_thr,
+                              (r >> 24 & 0xFFFFFF) < corrupt_thr,
+                              low + (r >> 48) * step))
+        return iter(decisions)
+    
+    def decide(self):
+        """Return the (drop, corrupt, delay) decision for the next packet"""
+        decision = next(self._decisions, None)
+        if decision is None:
+            self._decisions = self._draw_decisions(self.DRAW_BLOCK)
+            decision = next(self._decisions)
+        return decision
+
+
+# Last formatted wall-clock second, reused until the second changes
+_LAST_SEC = [0, ""]
+
+
+def _timestamp():
+    """Format the current time as HH:MM:SS.mmm, caching the per-second prefix"""
+    sec, ns = divmod(time.time_ns(), 1_000_000_000)
+    if sec != _LAST_SEC[0]:
+        _LAST_SEC[:] = [sec, time.strftime("%H:%M:%S", time.localtime(sec))]
+    return f"{_LAST_SEC[1]}.{ns // 1_000_000:03d}"
+
+
+def _ack_label(packet):
+    """Format an ACK's number, marking cumulative ACKs"""
+    return f"≤{packet.ack_number}" if packet.cumulative else str(packet.ack_number)
+
+
+def _printable(data):
+    """Decode a packet payload for display"""
+    return str(data, "utf-8", "replace")
+
+
+class _LogWriter:
+    """Buffers log lines and writes them to stdout in batches from a background thread"""
+    
+    def __init__(self):
+        self._lines = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
     
-    def should_corrupt_packet(self):
-        """Determine if a packet should be corrupted"""
-        return random.random() < self.corruption_rate
+    def write(self, line):
+        """Queue a log line, starting the writer thread on first use"""
+        self._lines.put(line)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
     
-    def get_delay(self):
-        """Get a random network delay"""
-        return random.uniform(self.delay_min, self.delay_max)
+    def flush(self):
+        """Wait until every line queued so far has been written"""
+        if self._thread is None or not self._thread.is_alive():
+            return  # Nothing has been logged, or no writer is left to release the marker
+        done = threading.Event()
+        self._lines.put(done)
+        done.wait()
+    
+    def _run(self):
+        """Block for the next line, then write it with everything queued behind it"""
+        get, get_nowait = self._lines.get, self._lines.get_nowait
+        while True:
+            batch = [get()]
+            try:
+                while True:
+                    batch.append(get_nowait())
+            except queue.Empty:
+                pass
+            
+            # flush() markers are queued as Events and released once written
+            lines = [item for item in batch if isinstance(item, str)]
+            try:
+                if lines:
+                    sys.stdout.write("\n".join(lines) + "\n")
+                    sys.stdout.flush()
+            except (OSError, ValueError):
+                pass  # stdout is gone (broken pipe or closed); drop the lines but keep serving
+            finally:
+                for item in batch:
+                    if not isinstance(item, str):
+                        item.set()
+
+
+_log = _LogWriter()
+
+# Log line templates with their colors baked in, filled with % formatting
+_FMT_SENT_ACK = f"{Fore.CYAN}%s %s → ACK %s%s{Style.RESET_ALL}"
+_FMT_SENT_SEQ = f"{Fore.GREEN}%s %s → SEQ %d ['%s']%s{Style.RESET_ALL}"
+_FMT_RECEIVED_ACK = f"{Fore.BLUE}%s %s ← ACK %s{Style.RESET_ALL}"
+_FMT_RECEIVED_SEQ = f"{Fore.YELLOW}%s %s ← SEQ %d ['%s']{Style.RESET_ALL}"
+_FMT_DROPPED_ACK = f"{Fore.RED}%s ✗ DROPPED ACK %s{Style.RESET_ALL}"
+_FMT_DROPPED_SEQ = f"{Fore.RED}%s ✗ DROPPED SEQ %d{Style.RESET_ALL}"
+_FMT_CORRUPTED_ACK = f"{Fore.MAGENTA}%s %s ← CORRUPTED ACK{Style.RESET_ALL}"
+_FMT_CORRUPTED_SEQ = f"{Fore.MAGENTA}%s %s ← CORRUPTED SEQ %d{Style.RESET_ALL}"
+_FMT_TIMEOUT = f"{Fore.RED}%s %s ! TIMEOUT SEQ %d{Style.RESET_ALL}"
+_FMT_INFO = f"{Fore.WHITE}%s ℹ %s{Style.RESET_ALL}"
+_RETRANSMIT = " (RETRANSMIT)"
+atexit.register(_log.flush)
 
 
 class Logger:
@@ -104,123 +281,136 @@ class Logger:
     
     def log_sent(self, sender, packet, is_retransmission=False):
         """Log sent packet"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.CYAN}{timestamp} {sender} → ACK {packet.ack_number}{' (RETRANSMIT)' if is_retransmission else ''}{Style.RESET_ALL}")
+            _log.write(_FMT_SENT_ACK % (timestamp, sender, _ack_label(packet), _RETRANSMIT if is_retransmission else ""))
         else:
-            print(f"{Fore.GREEN}{timestamp} {sender} → SEQ {packet.sequence} ['{packet.data}']{' (RETRANSMIT)' if is_retransmission else ''}{Style.RESET_ALL}")
+            _log.write(_FMT_SENT_SEQ % (timestamp, sender, packet.sequence, _printable(packet.data), _RETRANSMIT if is_retransmission else ""))
     
     def log_received(self, receiver, packet):
         """Log received packet"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.BLUE}{timestamp} {receiver} ← ACK {packet.ack_number}{Style.RESET_ALL}")
+            _log.write(_FMT_RECEIVED_ACK % (timestamp, receiver, _ack_label(packet)))
         else:
-            print(f"{Fore.YELLOW}{timestamp} {receiver} ← SEQ {packet.sequence} ['{packet.data}']{Style.RESET_ALL}")
+            _log.write(_FMT_RECEIVED_SEQ % (timestamp, receiver, packet.sequence, _printable(packet.data)))
     
     def log_dropped(self, packet):
         """Log dropped packet"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.RED}{timestamp} ✗ DROPPED ACK {packet.ack_number}{Style.RESET_ALL}")
+            _log.write(_FMT_DROPPED_ACK % (timestamp, _ack_label(packet)))
         else:
-            print(f"{Fore.RED}{timestamp} ✗ DROPPED SEQ {packet.sequence}{Style.RESET_ALL}")
+            _log.write(_FMT_DROPPED_SEQ % (timestamp, packet.sequence))
     
     def log_corrupted(self, receiver, packet):
         """Log corrupted packet"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.MAGENTA}{timestamp} {receiver} ← CORRUPTED ACK{Style.RESET_ALL}")
+            _log.write(_FMT_CORRUPTED_ACK % (timestamp, receiver))
         else:
-            print(f"{Fore.MAGENTA}{timestamp} {receiver} ← CORRUPTED SEQ {packet.sequence}{Style.RESET_ALL}")
+            _log.write(_FMT_CORRUPTED_SEQ % (timestamp, receiver, packet.sequence))
     
     def log_timeout(self, sender, sequence):
         """Log timeout"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"{Fore.RED}{timestamp} {sender} ! TIMEOUT SEQ {sequence}{Style.RESET_ALL}")
+        timestamp = _timestamp()
+        _log.write(_FMT_TIMEOUT % (timestamp, sender, sequence))
     
     def log_info(self, message):
         """Log general information"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"{Fore.WHITE}{timestamp} ℹ {message}{Style.RESET_ALL}")
+        timestamp = _timestamp()
+        _log.write(_FMT_INFO % (timestamp, message))
+
+
+def tune_socket(sock, rcvbuf=SOCKET_BUFFER_SIZE, sndbuf=SOCKET_BUFFER_SIZE):
+    """Enlarge the socket buffers and disable path MTU discovery on Linux
+    
+    Returns the (rcvbuf, sndbuf) sizes actually granted, which the kernel caps
+    at net.core.rmem_max / wmem_max.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if sys.platform.startswith("linux"):
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DONT)
+    return (sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+            sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF))
+
+
+# How long in-order packets wait to be covered by one cumulative ACK
+DELAYED_ACK_TIMEOUT = 0.005
 
 
 class RUDPServer:
     """RUDP Server implementation"""
     
-    def __init__(self, loss_rate=0.1, corruption_rate=0.05, delay_min=0.02, delay_max=0.1):
+    def __init__(self, loss_rate=0.1, corruption_rate=0.05, delay_min=0.02, delay_max=0.1, window_size=8,
+                 delayed_ack=True):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        tune_socket(self.socket)
         self.socket.bind(('127.0.0.1', 5000))
+        self.socket.setblocking(False)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self.socket, selectors.EVENT_READ)
         
         self.network = NetworkSimulator(loss_rate, corruption_rate, delay_min, delay_max)
         self.logger = Logger()
         self.expected_sequence = 0
         self.received_data = []
         self.running = False
+        
+        # Ring buffer of out-of-order payloads indexed by sequence % window_size
+        self.window_size = window_size
+        self.window = [None] * window_size
+        self.present = bytearray(window_size)
+        
+        # Coalesce in-order ACKs into cumulative ACKs
+        self.delayed_ack = delayed_ack
+        self._ack_pending = False
+        
+        # Packets and ACKs delayed by the simulated network, as a min-heap
+        # of (due_time, order, callback, args)
+        self._in_transit = []
+        self._event_order = itertools.count()
+        
+        # Receive into one preallocated buffer instead of a new bytes per datagram
+        self._rxbuf = bytearray(2048)
+        self._rxview = memoryview(self._rxbuf)
     
     def start(self):
         """Start the server"""
         self.running = True
         self.logger.log_info("Server started on 127.0.0.1:5000")
         
-        self.socket.settimeout(0.1)  # Short timeout to check if we should stop
-        
         while self.running:
+            # Run deliveries and ACKs whose simulated delay has elapsed
+            self._run_due_events()
+            
             try:
-                # Wait for data from client
-                json_data, client_address = self.socket.recvfrom(1024)
+                # Wait for data from client, waking up for the next scheduled event
+                if not self._sel.select(self._next_event_timeout()):
+                    continue
+                n, client_address = self.socket.recvfrom_into(self._rxbuf, 2048)
+                data = self._rxview[:n]
                 
                 # Simulate network conditions
-                if self.network.should_drop_packet():
+                drop, corrupt, delay = self.network.decide()
+                if drop:
                     # Simulate packet loss
-                    packet = RUDPPacket.from_json(json_data.decode())
+                    packet = RUDPPacket.from_bytes(data)
                     self.logger.log_dropped(packet)
                     continue
                 
-                # Simulate network delay
-                delay = self.network.get_delay()
-                time.sleep(delay)
-                
-                # Process the packet
-                packet = RUDPPacket.from_json(json_data.decode())
-                
-                # Simulate corruption
-                if self.network.should_corrupt_packet():
-                    packet.checksum = random.randint(0, 65535)  # Corrupt the checksum
-                    self.logger.log_corrupted("SERVER", packet)
-                    continue  # Discard corrupted packets
-                
-                # Log received packet
-                self.logger.log_received("SERVER", packet)
+                # Simulate network delay; the packet is processed once it arrives
+                packet = RUDPPacket.from_bytes(data)
+                self._schedule(delay, self._deliver, client_address, packet, corrupt)
                 
-                # Verify packet integrity
-                if not packet.verify_checksum():
-                    self.logger.log_corrupted("SERVER", packet)
-                    continue
-                
-                # Process packet based on expected sequence
-                if packet.sequence == self.expected_sequence:
-                    # This is the packet we're expecting
-                    self.received_data.append(packet.data)
-                    
-                    # Send ACK
-                    self._send_ack(client_address, packet.sequence)
-                    
-                    # Update expected sequence
-                    self.expected_sequence += 1
-                    
-                elif packet.sequence < self.expected_sequence:
-                    # This is a duplicate packet, still send ACK
-                    self.logger.log_info(f"Duplicate packet with SEQ {packet.sequence}, expected {self.expected_sequence}")
-                    self._send_ack(client_address, packet.sequence)
-                
-            except socket.timeout:
-                # Socket timeout - just continue the loop
-                continue
             except Exception as e:
                 if self.running:  # Only log if we're still running
                     self.logger.log_info(f"Server error: {str(e)}")
@@ -228,33 +418,123 @@ class RUDPServer:
         
         # Print summary
         if self.received_data:
-            received_message = "".join(self.received_data)
+            received_message = b"".join(self.received_data).decode("utf-8", "replace")
             self.logger.log_info(f"Received complete message: '{received_message}'")
         
+        self._sel.close()
         try:
             self.socket.close()
         except:
             pass
     
-    def _send_ack(self, client_address, sequence):
+    def _deliver(self, client_address, packet, corrupt):
+        """Process a data packet once its simulated network delay has elapsed"""
+        # Simulate corruption
+        if corrupt:
+            packet.checksum ^= 1  # Corrupt the checksum
+            self.logger.log_corrupted("SERVER", packet)
+            return  # Discard corrupted packets
+        
+        # Log received packet
+        self.logger.log_received("SERVER", packet)
+        
+        # Packet integrity was verified when it was parsed
+        if packet.is_corrupted:
+            self.logger.log_corrupted("SERVER", packet)
+            return
+        
+        # Only data packets may reach the receive window; ACKs and unknown types are dropped
+        if packet.packet_type != _TYPE_DATA:
+            self.logger.log_info(f"Dropped packet of unexpected type 0x{packet.packet_type:02x}")
+            return
+        
+        # Process packet based on expected sequence
+        if packet.sequence == self.expected_sequence:
+            # This is the packet we're expecting
+            self.received_data.append(packet.data)
+            
+            # Send ACK, or let a cumulative ACK cover it shortly
+            if self.delayed_ack:
+                self._delay_ack(client_address)
+            else:
+                self._send_ack(client_address, packet.sequence)
+            
+            # Update expected sequence, flushing any buffered packets that are now in order
+            self.expected_sequence += 1
+            slot = self.expected_sequence % self.window_size
+            while self.present[slot]:
+                self.received_data.append(self.window[slot])
+                self.window[slot] = None
+                self.present[slot] = 0
+                self.expected_sequence += 1
+                slot = self.expected_sequence % self.window_size
+            
+        elif packet.sequence < self.expected_sequence:
+            # This is a duplicate packet, still send ACK
+            self.logger.log_info(f"Duplicate packet with SEQ {packet.sequence}, expected {self.expected_sequence}")
+            self._send_ack(client_address, packet.sequence)
+        elif packet.sequence >= self.expected_sequence + self.window_size:
+            # Beyond the receive window, the sender will retransmit it later
+            self.logger.log_info(f"Packet with SEQ {packet.sequence} beyond receive window, expected {self.expected_sequence}")
+        else:
+            # Out of order packet, buffer it until the gap is filled
+            self.logger.log_info(f"Out of order packet with SEQ {packet.sequence}, expected {self.expected_sequence}")
+            slot = packet.sequence % self.window_size
+            self.window[slot] = packet.data
+            self.present[slot] = 1
+            self._send_ack(client_address, packet.sequence)
+    
+    def _schedule(self, delay, callback, *args):
+        """Run a callback once a simulated network delay has elapsed"""
+        heapq.heappush(self._in_transit, (time.monotonic() + delay, next(self._event_order), callback, args))
+    
+    def _run_due_events(self):
+        """Run every scheduled callback whose simulated delay has elapsed"""
+        now = time.monotonic()
+        while self._in_transit and self._in_transit[0][0] <= now:
+            _, _, callback, args = heapq.heappop(self._in_transit)
+            try:
+                callback(*args)
+            except Exception as e:
+                self.logger.log_info(f"Server error: {str(e)}")
+    
+    def _next_event_timeout(self):
+        """Get how long to wait for data before the next scheduled event is due"""
+        if not self._in_transit:
+            return 0.1
+        return min(0.1, max(0.001, self._in_transit[0][0] - time.monotonic()))
+    
+    def _delay_ack(self, client_address):
+        """Arrange for a cumulative ACK unless one is already pending"""
+        if not self._ack_pending:
+            self._ack_pending = True
+            self._schedule(DELAYED_ACK_TIMEOUT, self._flush_ack, client_address)
+    
+    def _flush_ack(self, client_address):
+        """Acknowledge every packet delivered in order so far with one ACK"""
+        self._ack_pending = False
+        self._send_ack(client_address, self.expected_sequence - 1, cumulative=True)
+    
+    def _send_ack(self, client_address, sequence, cumulative=False):
         """Send acknowledgment for a sequence number"""
-        ack_packet = RUDPPacket(is_ack=True, ack_number=sequence)
+        ack_packet = RUDPPacket(is_ack=True, ack_number=sequence, cumulative=cumulative)
         
         # Log sent ACK
         self.logger.log_sent("SERVER", ack_packet)
         
         # Simulate packet loss for ACK
-        if self.network.should_drop_packet():
+        drop, _, delay = self.network.decide()
+        if drop:
             self.logger.log_dropped(ack_packet)
             return
         
         # Simulate network delay for ACK
-        delay = self.network.get_delay()
-        time.sleep(delay)
-        
-        # Send the ACK
+        self._schedule(delay, self._sendto, ack_packet.to_bytes(), client_address)
+    
+    def _sendto(self, data, client_address):
+        """Send a datagram to the client"""
         try:
-            self.socket.sendto(ack_packet.to_json().encode(), client_address)
+            self.socket.sendto(data, client_address)
         except Exception as e:
             self.logger.log_info(f"Error sending ACK: {str(e)}")
     
@@ -270,11 +550,18 @@ class RUDPServer:
 class RUDPClient:
     """RUDP Client implementation"""
     
-    def __init__(self, loss_rate=0.1, corruption_rate=0.05, delay_min=0.02, delay_max=0.1, timeout=1.0, max_retries=5):
+    def __init__(self, loss_rate=0.1, corruption_rate=0.05, delay_min=0.02, delay_max=0.1, timeout=1.0, max_retries=5, window_size=8):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        
         self.server_address = ('127.0.0.1', 5000)
         
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.settimeout(timeout)
+        tune_socket(self.socket)
+        self.socket.setblocking(False)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self.socket, selectors.EVENT_READ)
+        self.socket.connect(self.server_address)  # Skip the address lookup on each send
         
         self.network = NetworkSimulator(loss_rate, corruption_rate, delay_min, delay_max)
         self.logger = Logger()
@@ -282,90 +569,202 @@ class RUDPClient:
         self.next_sequence = 0
         self.timeout = timeout
         self.max_retries = max_retries
+        self.window_size = window_size
+        
+        # Packets delayed by the simulated network, as a min-heap of
+        # (due_time, sequence, packet_bytes)
+        self._in_transit = []
+        
+        # Upper bound for the exponentially backed-off retransmission timeout
+        self.max_backoff = timeout * 8
+        
+        # Receive ACKs on a background thread so they are never held up by the sender
+        self._ack_q = queue.Queue()
+        self._rxbuf = bytearray(2048)
+        self._rxview = memoryview(self._rxbuf)
+        self._reading = True
+        self._reader_thread = threading.Thread(target=self._ack_reader, daemon=True)
+        self._reader_thread.start()
+    
+    def _ack_reader(self):
+        """Receive packets from the server and queue them for the sender"""
+        while self._reading:
+            try:
+                if self._sel.select(0.1):
+                    n = self.socket.recv_into(self._rxbuf, 2048)
+                    self._ack_q.put(RUDPPacket.from_bytes(self._rxview[:n]))
+            except (ConnectionResetError, ConnectionRefusedError) as e:
+                self.logger.log_info(f"Client error: {str(e)}")
+            except (OSError, ValueError):
+                break  # Socket was closed
+    
+    def _retransmit_timeout(self, retries):
+        """Get the jittered, backed-off retransmission timeout for a packet"""
+        # Jitter only lengthens the wait, so no timer fires before the configured timeout;
+        # clamping after it keeps max_backoff a true upper bound
+        return min(self.max_backoff, self.timeout * (2 ** retries) * random.uniform(1.0, 1.5))
     
     def send_message(self, message):
         """Send a message reliably using RUDP"""
         self.logger.log_info(f"Sending message to {self.server_address[0]}:{self.server_address[1]}")
         
-        # Break message into chunks
+        # Break message into chunks sliced lazily from the encoded bytes
         chunk_size = 5  # Small size for demonstration
-        chunks = [message[i:i+chunk_size] for i in range(0, len(message), chunk_size)]
+        payload = memoryview(message.encode("utf-8"))
         
-        for chunk in chunks:
-            # Create packet
-            packet = RUDPPacket(sequence=self.next_sequence, data=chunk)
-            retries = 0
-            sent = False
+        # Selective Repeat sender state, keyed by sequence number
+        base = self.next_sequence
+        next_seq = self.next_sequence
+        end_seq = self.next_sequence + (len(payload) + chunk_size - 1) // chunk_size
+        unacked_packet = {}
+        expires = {}  # Retransmission deadline, drawn once per send so the jitter holds
+        retries = {}
+        sends = 0
+        replies = 0
+        self._in_transit.clear()
+        
+        # Bind hot-loop lookups to local names once
+        monotonic = time.monotonic
+        wall_time = time.time
+        transmit = self._transmit
+        dispatch_due = self._dispatch_due
+        ack_get = self._ack_q.get
+        ack_get_nowait = self._ack_q.get_nowait
+        retransmit_timeout = self._retransmit_timeout
+        decide = self.network.decide
+        log_received = self.logger.log_received
+        log_dropped = self.logger.log_dropped
+        in_transit = self._in_transit
+        window_size = self.window_size
+        first_seq = self.next_sequence
+        
+        while base < end_seq:
+            # Fill the send window with new packets, reading the clocks once for all of them
+            if next_seq < base + window_size and next_seq < end_seq:
+                stamp, sent_at = wall_time(), monotonic()
+            while next_seq < base + window_size and next_seq < end_seq:
+                offset = (next_seq - first_seq) * chunk_size
+                # Zero-copy slice of the encoded message; checksum and packing read it in place
+                packet = RUDPPacket(sequence=next_seq, data=payload[offset:offset + chunk_size], timestamp=stamp)
+                unacked_packet[next_seq] = packet
+                retries[next_seq] = 0
+                transmit(packet, sent_at)
+                sends += 1
+                expires[next_seq] = sent_at + retransmit_timeout(0)
+                next_seq += 1
             
-            while not sent and retries < self.max_retries:
-                # Simulate packet loss
-                if self.network.should_drop_packet():
-                    self.logger.log_sent("CLIENT", packet, is_retransmission=(retries > 0))
-                    self.logger.log_dropped(packet)
-                    retries += 1
-                    time.sleep(self.timeout / 2)  # Wait a bit less than full timeout
-                    continue
-                
-                # Simulate network delay
-                delay = self.network.get_delay()
-                time.sleep(delay)
-                
-                # Simulate corruption
-                if self.network.should_corrupt_packet():
-                    corrupted_packet = RUDPPacket(sequence=packet.sequence, data=packet.data)
-                    corrupted_packet.checksum = random.randint(0, 65535)  # Corrupt the checksum
-                    self.logger.log_sent("CLIENT", corrupted_packet, is_retransmission=(retries > 0))
-                    self.socket.sendto(corrupted_packet.to_json().encode(), self.server_address)
-                    retries += 1
-                    time.sleep(self.timeout / 2)
-                    continue
+            # Hand over packets whose simulated network delay has elapsed
+            dispatch_due()
+            
+            # Wait for an ACK until the earliest retransmission or dispatch deadline
+            deadline = min(expires.values())
+            if in_transit:
+                deadline = min(deadline, in_transit[0][0])
+            try:
+                ack_packet = ack_get(timeout=max(0.0, deadline - monotonic()))
+            except queue.Empty:
+                ack_packet = None
+            
+            # Handle every ACK already queued before recomputing deadlines
+            while ack_packet is not None:
+                # The server answers each data packet at most once, so more
+                # replies than sends can only come from a misbehaving peer.
+                # Late ACKs for an earlier message are not counted.
+                if not ack_packet.is_ack or ack_packet.ack_number >= first_seq:
+                    replies += 1
+                if replies > sends:
+                    self.logger.log_info(f"Giving up after {replies} replies to {sends} packets sent")
+                    return False
                 
-                # Log sent packet
-                self.logger.log_sent("CLIENT", packet, is_retransmission=(retries > 0))
+                # Simulate packet loss for ACK
+                if decide()[0]:
+                    log_dropped(ack_packet)
+                else:
+                    # Log received ACK
+                    log_received("CLIENT", ack_packet)
+                    
+                    # Only ACKs for packets still in flight advance the window;
+                    # a cumulative ACK covers every packet up to its number
+                    if not ack_packet.is_ack:
+                        acked = ()
+                    elif ack_packet.cumulative:
+                        acked = [s for s in unacked_packet if s <= ack_packet.ack_number]
+                    elif ack_packet.ack_number in unacked_packet:
+                        acked = (ack_packet.ack_number,)
+                    else:
+                        acked = ()
+                    
+                    if acked:
+                        for seq in acked:
+                            del unacked_packet[seq]
+                            del expires[seq]
+                            del retries[seq]
+                        while base < next_seq and base not in unacked_packet:
+                            base += 1
+                    else:
+                        self.logger.log_info(f"Unexpected ACK number: {ack_packet.ack_number}, window: {base}-{next_seq - 1}")
                 
-                # Send the packet
                 try:
-                    self.socket.sendto(packet.to_json().encode(), self.server_address)
-                    
-                    # Wait for ACK
-                    try:
-                        json_data, _ = self.socket.recvfrom(1024)
-                        
-                        # Simulate packet loss for ACK
-                        if self.network.should_drop_packet():
-                            ack_packet = RUDPPacket.from_json(json_data.decode())
-                            self.logger.log_dropped(ack_packet)
-                            retries += 1
-                            continue
-                        
-                        # Process the ACK
-                        ack_packet = RUDPPacket.from_json(json_data.decode())
-                        
-                        # Log received ACK
-                        self.logger.log_received("CLIENT", ack_packet)
-                        
-                        # Verify this is the ACK we're expecting
-                        if ack_packet.is_ack and ack_packet.ack_number == self.next_sequence:
-                            self.next_sequence += 1
-                            sent = True
-                        else:
-                            self.logger.log_info(f"Unexpected ACK number: {ack_packet.ack_number}, expected: {self.next_sequence}")
-                    except socket.timeout:
-                        self.logger.log_timeout("CLIENT", packet.sequence)
-                        retries += 1
-                except Exception as e:
-                    self.logger.log_info(f"Client error: {str(e)}")
-                    retries += 1
+                    ack_packet = ack_get_nowait()
+                except queue.Empty:
+                    ack_packet = None
             
-            if not sent:
-                self.logger.log_info(f"Failed to send chunk '{chunk}' after {self.max_retries} retries")
-                return False
+            # Retransmit each timed out packet individually
+            now = monotonic()
+            for seq in [s for s in unacked_packet if now >= expires[s]]:
+                self.logger.log_timeout("CLIENT", seq)
+                retries[seq] += 1
+                if retries[seq] >= self.max_retries:
+                    self.logger.log_info(f"Failed to send chunk '{str(unacked_packet[seq].data, 'utf-8', 'replace')}' after {self.max_retries} retries")
+                    return False
+                unacked_packet[seq].refresh_timestamp()
+                transmit(unacked_packet[seq], now, is_retransmission=True)
+                sends += 1
+                expires[seq] = now + retransmit_timeout(retries[seq])
         
+        self.next_sequence = end_seq
         self.logger.log_info(f"Message sent successfully")
         return True
     
+    def _transmit(self, packet, now, is_retransmission=False):
+        """Send a packet through the simulated network, timing any delay from the caller's clock read"""
+        drop, corrupt, delay = self.network.decide()
+        
+        # Simulate packet loss; the retransmission timer recovers it
+        if drop:
+            self.logger.log_sent("CLIENT", packet, is_retransmission)
+            self.logger.log_dropped(packet)
+            return
+        
+        # Simulate network delay; the packet is handed to the socket once due
+        due = now + delay
+        
+        # Simulate corruption by flipping a checksum bit in the outgoing bytes only
+        if corrupt:
+            data = packet.to_corrupted_bytes()
+        else:
+            data = packet.to_bytes()
+        
+        # Log sent packet
+        self.logger.log_sent("CLIENT", packet, is_retransmission)
+        
+        heapq.heappush(self._in_transit, (due, packet.sequence, data))
+    
+    def _dispatch_due(self):
+        """Send every delayed packet whose simulated network delay has elapsed"""
+        now = time.monotonic()
+        while self._in_transit and self._in_transit[0][0] <= now:
+            _, _, data = heapq.heappop(self._in_transit)
+            try:
+                self.socket.send(data)
+            except Exception as e:
+                self.logger.log_info(f"Client error: {str(e)}")
+    
     def close(self):
-        """Close the socket"""
+        """Stop the ACK reader and close the socket"""
+        self._reading = False
+        self._reader_thread.join()
+        self._sel.close()
         try:
             self.socket.close()
         except:
@@ -384,44 +783,44 @@ def run_demo():
     print(f"• Network Delay: 0.02s to 0.10s")
     print(f"• Timeout: 1.00s")
     print(f"• Max Retries: 5")
+    print(f"• Window Size: 8")
     print(f"• Message: 'Hello, RUDP! This is a test.'")
     
     print(f"\n{Fore.WHITE}╔══════════════════════════════════════════════════╗")
     print(f"║                 SIMULATION LOG                   ║")
     print(f"╚══════════════════════════════════════════════════╝{Style.RESET_ALL}")
     
-    # Create and start server in a separate thread
+    # Create and start server in a separate thread; its socket is bound on
+    # construction, so anything the client sends first waits in the socket buffer
     server = RUDPServer()
     server_thread = threading.Thread(target=server.start)
     server_thread.daemon = True
     server_thread.start()
     
-    # Give server a moment to start
-    time.sleep(1)
-    
     # Create and use client
     client = RUDPClient()
     
     try:
         success = client.send_message("Hello, RUDP! This is a test.")
+        _log.flush()
         if success:
             print(f"\n{Fore.GREEN}Message sent successfully{Style.RESET_ALL}")
         else:
             print(f"\n{Fore.RED}Failed to send message{Style.RESET_ALL}")
     except Exception as e:
+        _log.flush()
         print(f"\n{Fore.RED}Error: {str(e)}{Style.RESET_ALL}")
     finally:
         client.close()
         
-    # Let server process any remaining packets
-    time.sleep(2)
+    # The client only finishes once every chunk is ACKed, so the server already
+    # holds the message; wait for its loop to notice it has been stopped
     server.stop()
-    
-    # Give server thread time to notice it's been stopped
-    time.sleep(0.5)
+    server_thread.join()
     
     # Show received message
-    received_message = "".join(server.received_data)
+    _log.flush()
+    received_message = b"".join(server.received_data).decode("utf-8", "replace")
     print(f"\n{Fore.WHITE}Demonstration complete!{Style.RESET_ALL}")
     print(f"{Fore.CYAN}Sent message: 'Hello, RUDP! This is a test.'{Style.RESET_ALL}")
     print(f"{Fore.CYAN}Received message: '{received_message}'{Style.RESET_ALL}")
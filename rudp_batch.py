@@ -0,0 +1,358 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import sys
+import weakref
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # Not POSIX; the recvmmsg path is Linux-only anyway
+    fcntl = termios = None
+
+# Flags for recvmmsg(2)
+MSG_DONTWAIT = 0x40
+
+# Decoded peer addresses a BatchReceiver keeps before starting over
+MAX_CACHED_ADDRESSES = 1024
+
+# UDP generic segmentation offload (Linux 4.18+); the values are used as a
+# fallback for Python versions whose socket module does not export them
+SOL_UDP = getattr(socket, "SOL_UDP", 17)
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)
+
+# Kernel limits on a single GSO send: UDP_MAX_SEGMENTS and the IPv4 UDP payload
+GSO_MAX_SEGMENTS = 64
+GSO_MAX_BYTES = 65507
+
+# memoryview format for one pointer-sized word (iov_base and iov_len)
+_WORD = "Q" if ctypes.sizeof(ctypes.c_size_t) == 8 else "I"
+
+
+class IOVec(ctypes.Structure):
+    """struct iovec"""
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class MsgHdr(ctypes.Structure):
+    """struct msghdr"""
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class MMsgHdr(ctypes.Structure):
+    """struct mmsghdr"""
+    _fields_ = [
+        ("msg_hdr", MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+class SockAddrIn(ctypes.Structure):
+    """struct sockaddr_in"""
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint8 * 2),
+        ("sin_addr", ctypes.c_uint8 * 4),
+        ("sin_zero", ctypes.c_uint8 * 8),
+    ]
+
+
+def _load_libc():
+    """Load libc if it provides sendmmsg/recvmmsg, otherwise return None"""
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def _set_sockaddr_in(sockaddr, address):
+    """Fill a sockaddr_in for an IPv4 (host, port) tuple"""
+    sockaddr.sin_addr[:] = socket.inet_aton(address[0])
+    sockaddr.sin_family = socket.AF_INET
+    sockaddr.sin_port[:] = struct.pack("!H", address[1])
+
+
+class _BatchSender:
+    """sendmmsg state for one socket, allocated once and reused for every batch"""
+    
+    def __init__(self, vlen=64, bufsize=2048):
+        self.vlen = vlen
+        self.bufsize = bufsize
+        
+        # Each batch is joined and copied into one contiguous area the iovecs point into
+        self._buf = bytearray(vlen * bufsize)
+        self._view = memoryview(self._buf)
+        self._base = ctypes.addressof((ctypes.c_char * len(self._buf)).from_buffer(self._buf))
+        self._name = SockAddrIn()
+        self._address = None
+        self._named = None  # Whether the headers carry self._name, set on first send
+        
+        self._iovecs = (IOVec * vlen)()
+        self._msgs = (MMsgHdr * vlen)()
+        for i in range(vlen):
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+        
+        # An iovec is two pointer-sized words, iov_base then iov_len; writing them
+        # through a flat view skips building a ctypes object per field access
+        self._iov_words = memoryview(self._iovecs).cast("B").cast(_WORD)
+        word = ctypes.sizeof(ctypes.c_size_t)
+        self._iov_stride = ctypes.sizeof(IOVec) // word
+        self._iov_base = IOVec.iov_base.offset // word
+        self._iov_len = IOVec.iov_len.offset // word
+    
+    def send(self, fd, datagrams, address):
+        """Send up to vlen datagrams with one sendmmsg call and return how many went out
+        
+        Returns 0 without sending when the batch does not fit the buffer or the
+        address is not a literal IPv4 address, leaving the caller to send them.
+        """
+        if address != self._address:
+            if address is not None:
+                try:
+                    _set_sockaddr_in(self._name, address)
+                except OSError:
+                    return 0
+            self._address = address
+        
+        # Every header points at the one shared sockaddr, so they only change
+        # when the socket switches between connected and addressed sends
+        named = address is not None
+        if named != self._named:
+            name = ctypes.addressof(self._name) if named else None
+            namelen = ctypes.sizeof(SockAddrIn) if named else 0
+            for i in range(self.vlen):
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_name = name
+                hdr.msg_namelen = namelen
+            self._named = named
+        
+        joined = b"".join(datagrams)
+        if len(joined) > len(self._buf):
+            return 0
+        self._view[:len(joined)] = joined
+        
+        iov_words, pointer = self._iov_words, self._base
+        stride, base_word, len_word = self._iov_stride, self._iov_base, self._iov_len
+        for i, data in enumerate(datagrams):
+            size = len(data)
+            iov_words[stride * i + base_word] = pointer
+            iov_words[stride * i + len_word] = size
+            pointer += size
+        
+        result = _libc.sendmmsg(fd, self._msgs, len(datagrams), 0)
+        if result < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        return result
+
+
+# Send-side state per socket (None where sendmmsg cannot be used), dropped along with the socket
+_senders = weakref.WeakKeyDictionary()
+
+
+def send_batch(sock, datagrams, address=None):
+    """Send datagrams with sendmmsg when there are several, otherwise plain sends
+
+    Pass address=None to send on a connected socket.
+    """
+    if not datagrams:
+        return
+
+    sent = 0
+    if len(datagrams) > 1:
+        try:
+            sender = _senders[sock]
+        except KeyError:
+            batchable = _libc is not None and sock.family == socket.AF_INET
+            sender = _senders[sock] = _BatchSender() if batchable else None
+    else:
+        sender = None
+    
+    if sender is not None:
+        fd, vlen = sock.fileno(), sender.vlen
+        while sent < len(datagrams):
+            chunk = datagrams[sent:sent + vlen]
+            result = sender.send(fd, chunk, address)
+            sent += result
+            if result < len(chunk):
+                break
+
+    # One send per datagram for a single datagram or anything the batch left over
+    for data in datagrams[sent:]:
+        if address is None:
+            sock.send(data)
+        else:
+            sock.sendto(data, address)
+
+
+def send_gso(sock, datagrams, address=None):
+    """Send runs of equal-sized datagrams with one UDP_SEGMENT sendmsg each
+
+    The kernel splits every run back into datagrams of the run's segment size,
+    so only the last datagram of a run may be shorter. Falls back to
+    send_batch off Linux or when the kernel does not support GSO.
+    """
+    if not sys.platform.startswith("linux"):
+        send_batch(sock, datagrams, address)
+        return
+    
+    start = 0
+    while start < len(datagrams):
+        size = len(datagrams[start])
+        end = start + 1
+        while (end < len(datagrams) and end - start < GSO_MAX_SEGMENTS
+               and (end - start + 1) * size <= GSO_MAX_BYTES
+               and len(datagrams[end]) <= size):
+            end += 1
+            if len(datagrams[end - 1]) < size:
+                break  # A short datagram can only end a run
+        
+        run = datagrams[start:end]
+        if len(run) == 1:
+            send_batch(sock, run, address)
+        else:
+            ancdata = [(SOL_UDP, UDP_SEGMENT, struct.pack("=H", size))]
+            try:
+                if address is None:
+                    sock.sendmsg([b"".join(run)], ancdata)
+                else:
+                    sock.sendmsg([b"".join(run)], ancdata, 0, address)
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.EIO, errno.ENOPROTOOPT, errno.EOPNOTSUPP):
+                    raise
+                send_batch(sock, run, address)
+        start = end
+
+
+class BatchReceiver:
+    """Receive datagrams from a socket into buffers allocated once up front"""
+    
+    def __init__(self, sock, vlen=32, bufsize=2048):
+        self.sock = sock
+        self.vlen = vlen
+        self.bufsize = bufsize
+        
+        # One contiguous receive area, sliced per datagram through a memoryview
+        self._buf = bytearray(vlen * bufsize)
+        self._view = memoryview(self._buf)
+        self._first = self._view[:bufsize]
+        self._used = vlen  # recvmmsg slots whose msg_namelen the kernel overwrote
+        self._addresses = {}  # Raw sockaddr bytes to (host, port), since peers repeat
+        self._pending = bytearray(4)  # FIONREAD result: size of the next queued datagram
+        self._error = None  # recvmmsg failure held back until the next call
+        
+        if _libc is None or vlen < 2 or sock.family != socket.AF_INET:
+            self._msgs = None
+            return
+        
+        base = ctypes.addressof((ctypes.c_char * len(self._buf)).from_buffer(self._buf))
+        self._iovecs = (IOVec * vlen)()
+        self._names = (SockAddrIn * vlen)()
+        names_view = memoryview(self._names).cast("B")
+        name_size = ctypes.sizeof(SockAddrIn)
+        
+        # Per-slot views, sliced once: each sender's port and address, and its payload area
+        self._name_slots = [names_view[i * name_size + 2:i * name_size + 8] for i in range(vlen)]
+        self._slots = [self._view[i * bufsize:(i + 1) * bufsize] for i in range(vlen)]
+        self._msgs = (MMsgHdr * vlen)()
+        for i in range(vlen):
+            self._iovecs[i].iov_base = base + i * bufsize
+            self._iovecs[i].iov_len = bufsize
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.cast(ctypes.pointer(self._names[i]), ctypes.c_void_p)
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+        
+        # recvmmsg fills the slots after the first, which recvfrom_into already took
+        self._rest = ctypes.pointer(self._msgs[1])
+        
+        # msg_namelen and msg_len are 32-bit fields at fixed offsets in each mmsghdr;
+        # a flat view of 32-bit words reads and writes them without per-field ctypes objects
+        self._msg_words = memoryview(self._msgs).cast("B").cast("I")
+        self._msg_stride = ctypes.sizeof(MMsgHdr) // 4
+        self._namelen_word = (MMsgHdr.msg_hdr.offset + MsgHdr.msg_namelen.offset) // 4
+        self._len_word = MMsgHdr.msg_len.offset // 4
+    
+    def recv(self):
+        """Receive up to vlen waiting datagrams as (memoryview, address) pairs
+        
+        The socket must already be readable. The first datagram is read with a
+        plain recvfrom_into; with recvmmsg, everything queued behind it (up to
+        vlen) follows in one more call that never blocks. The views point into
+        the shared buffer and are only valid until the next call. If recvmmsg
+        fails after the first datagram was read, that datagram is returned and
+        the error is raised on the next call.
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        
+        try:
+            n, address = self.sock.recvfrom_into(self._first)
+        except BlockingIOError:
+            return []
+        datagrams = [(self._view[:n], address)]
+        if self._msgs is None:
+            return datagrams
+        
+        # A cheap ioctl tells whether anything is queued behind it, so a lone
+        # datagram (the usual case) skips the costlier recvmmsg call
+        fd = self.sock.fileno()
+        fcntl.ioctl(fd, termios.FIONREAD, self._pending)
+        if self._pending == b"\0\0\0\0":
+            return datagrams
+        
+        # The kernel overwrites msg_namelen with the actual address length, so
+        # only the slots the previous call filled need resetting
+        msg_words, namelen = self._msg_words, ctypes.sizeof(SockAddrIn)
+        stride, namelen_word, len_word = self._msg_stride, self._namelen_word, self._len_word
+        for i in range(1, self._used):
+            msg_words[stride * i + namelen_word] = namelen
+        
+        result = _libc.recvmmsg(fd, self._rest, self.vlen - 1, MSG_DONTWAIT, None)
+        if result < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._used = 1
+                return datagrams
+            self._used = self.vlen
+            self._error = OSError(err, os.strerror(err))
+            return datagrams
+        self._used = result + 1
+        
+        name_slots, slots, addresses = self._name_slots, self._slots, self._addresses
+        append = datagrams.append
+        for i in range(1, result + 1):
+            name = name_slots[i].tobytes()  # sin_port and sin_addr
+            address = addresses.get(name)
+            if address is None:
+                if len(addresses) >= MAX_CACHED_ADDRESSES:
+                    addresses.clear()
+                address = addresses[name] = (socket.inet_ntoa(name[2:]), struct.unpack("!H", name[:2])[0])
+            append((slots[i][:msg_words[stride * i + len_word]], address))
+        return datagrams
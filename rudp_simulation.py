@@ -1,78 +1,146 @@
-import json
+import socket
 import time
+import struct
+import zlib
+import functools
 import random
+import queue
+import atexit
 import argparse
 import sys
-from datetime import datetime
+import threading
 from colorama import Fore, Back, Style, init
 
 # Initialize colorama for cross-platform colored terminal output
 init()
 
+# Binary wire formats, dispatched on the leading packet type byte:
+# data packets carry type, sequence, checksum, payload length, timestamp and
+# the payload, ACKs carry only type and the acknowledged sequence number.
+# A cumulative ACK acknowledges every sequence number up to its own.
+_TYPE_DATA = 0x00
+_TYPE_ACK = 0x01
+_TYPE_CUMULATIVE_ACK = 0x02
+_HDR = struct.Struct("!BIHHd")
+_ACK = struct.Struct("!BI")
+# Offset of the timestamp field within the header, patched in place on retransmit
+_TS_OFFSET = struct.calcsize("!BIHH")
+_TS = struct.Struct("!d")
+_CHECKSUM_OFFSET = struct.calcsize("!BI")
+
+
+@functools.lru_cache(maxsize=4096)
+def _ack_bytes(sequence, cumulative=False):
+    """Wire format of the ACK for a sequence number, packed once per sequence"""
+    return _ACK.pack(_TYPE_CUMULATIVE_ACK if cumulative else _TYPE_ACK, sequence)
+
+
+def _pack_data(sequence, checksum, timestamp, data):
+    """Wire format of a data packet, as a bytearray whose timestamp can be patched in place"""
+    buf = bytearray(_HDR.size + len(data))
+    _HDR.pack_into(buf, 0, _TYPE_DATA, sequence, checksum, len(data), timestamp)
+    buf[_HDR.size:] = data
+    return buf
+
+
+# Kernel socket buffer size, large enough to absorb bursts of retransmissions
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Default window in packets; the server discards data beyond its receive window
+# without an ACK, so a client's send window must not exceed the server's
+WINDOW_SIZE = 8
+
+# Linux values, for Python versions whose socket module does not export them
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+IP_PMTUDISC_DONT = getattr(socket, "IP_PMTUDISC_DONT", 0)
+
 class RUDPPacket:
     """Class representing a RUDP packet"""
     
-    def __init__(self, sequence=0, data="", is_ack=False, ack_number=None):
+    # Fixed attribute layout instead of a per-instance __dict__
+    __slots__ = ("sequence", "data", "is_ack", "ack_number", "cumulative", "checksum",
+                 "timestamp", "is_corrupted", "packet_type", "_buf")
+    
+    def __init__(self, sequence=0, data=b"", is_ack=False, ack_number=None, cumulative=False,
+                 timestamp=None):
         self.sequence = sequence
         self.data = data
         self.is_ack = is_ack
         self.ack_number = ack_number
+        self.cumulative = cumulative
         self.checksum = self._calculate_checksum(data) if not is_ack else 0
-        self.timestamp = time.time()
+        # Callers building several packets at once can share one clock read
+        if timestamp is None:
+            timestamp = time.time() if not is_ack else 0.0  # ACKs carry no timestamp
+        self.timestamp = timestamp
         self.is_corrupted = False
+        self.packet_type = (_TYPE_CUMULATIVE_ACK if cumulative else _TYPE_ACK) if is_ack else _TYPE_DATA
+        self._buf = None
     
-    def to_json(self):
-        """Convert packet to JSON"""
-        packet_dict = {
-            "sequence": self.sequence,
-            "is_ack": self.is_ack,
-            "checksum": self.checksum,
-            "timestamp": self.timestamp
-        }
-        
+    def to_bytes(self):
+        """Convert packet to its binary wire format"""
         if self.is_ack:
-            packet_dict["ack_number"] = self.ack_number
-        else:
-            packet_dict["data"] = self.data
-            
-        return json.dumps(packet_dict)
+            return _ack_bytes(self.ack_number, self.cumulative)
+        
+        # Materialize the wire bytes once; retransmits only patch the timestamp
+        if self._buf is None:
+            self._buf = _pack_data(self.sequence, self.checksum, self.timestamp, self.data)
+        return bytes(self._buf)
+    
+    def refresh_timestamp(self):
+        """Restamp the packet for retransmission"""
+        self.timestamp = time.time()
+        if self._buf is not None:
+            _TS.pack_into(self._buf, _TS_OFFSET, self.timestamp)
+    
+    def to_corrupted_bytes(self):
+        """Wire format with one checksum bit flipped, leaving the packet intact"""
+        buf = bytearray(self.to_bytes())
+        buf[_CHECKSUM_OFFSET] ^= 1
+        return bytes(buf)
     
     @staticmethod
-    def from_json(json_str):
-        """Create packet from JSON string"""
+    def from_bytes(buf):
+        """Create packet from its binary wire format, copying only the payload"""
+        # Every slot is assigned below, so skip __init__ and its checksum and clock read
+        packet = RUDPPacket.__new__(RUDPPacket)
+        packet.sequence = 0
+        packet.data = b""
+        packet.is_ack = False
+        packet.ack_number = None
+        packet.cumulative = False
+        packet.checksum = 0
+        packet.timestamp = 0.0
+        packet.is_corrupted = False
+        packet.packet_type = _TYPE_DATA
+        packet._buf = None
         try:
-            packet_dict = json.loads(json_str)
-            packet = RUDPPacket()
-            packet.sequence = packet_dict.get("sequence", 0)
-            packet.is_ack = packet_dict.get("is_ack", False)
-            packet.checksum = packet_dict.get("checksum", 0)
-            packet.timestamp = packet_dict.get("timestamp", time.time())
+            packet.packet_type = buf[0]  # Kept raw so receivers can reject unknown types
+            if buf[0] == _TYPE_ACK or buf[0] == _TYPE_CUMULATIVE_ACK:
+                _, packet.ack_number = _ACK.unpack_from(buf, 0)
+                packet.is_ack = True
+                packet.cumulative = buf[0] == _TYPE_CUMULATIVE_ACK
+                return packet
             
-            if packet.is_ack:
-                packet.ack_number = packet_dict.get("ack_number")
-                packet.data = ""
-            else:
-                packet.data = packet_dict.get("data", "")
-                packet.ack_number = None
-                
-            return packet
-        except json.JSONDecodeError:
-            # Return a corrupted packet indicator
-            packet = RUDPPacket()
+            _, sequence, checksum, data_len, timestamp = _HDR.unpack_from(buf, 0)
+            if len(buf) < _HDR.size + data_len:
+                raise struct.error("truncated payload")
+            
+            # Verify the checksum while parsing, over the payload still in the receive buffer
+            payload = buf[_HDR.size:_HDR.size + data_len]
+            packet.sequence = sequence
+            packet.data = bytes(payload)
+            packet.checksum = checksum
+            packet.timestamp = timestamp
+            packet.is_corrupted = zlib.crc32(payload) & 0xFFFF != checksum
+        except (struct.error, IndexError):
+            # Mark the packet as a corrupted packet indicator
             packet.is_corrupted = True
-            return packet
+        return packet
     
     def _calculate_checksum(self, data):
-        """Calculate a simple checksum for the data"""
-        return sum(ord(c) for c in data) % 65536
-    
-    def verify_checksum(self):
-        """Verify the integrity of the packet"""
-        if self.is_ack:
-            return True  # ACKs don't need checksum verification
-            
-        calculated_checksum = self._calculate_checksum(self.data)
-        return calculated_checksum == self.checksum
+        """Calculate a 16-bit CRC-32 based checksum for the data"""
+        return zlib.crc32(data) & 0xFFFF
 
 
 class NetworkSimulator:
@@ -84,17 +152,129 @@ class NetworkSimulator:
         self.delay_min = delay_min
         self.delay_max = delay_max
         
-    def should_drop_packet(self):
-        """Determine if a packet should be dropped"""
-        return random.random() < self.loss_rate
+        # Private generator, so draws skip the module-level random wrappers
+        self._rng = random.Random()
+        
+        # Pre-drawn decisions, refilled a block at a time once they run out
+        self._decisions = iter(())
     
-    def should_corrupt_packet(self):
-        """Determine if a packet should be corrupted"""
-        return random.random() < self.corruption_rate
+    # Number of decisions drawn each time the pre-drawn ones run out
+    DRAW_BLOCK = 4096
     
-    def get_delay(self):
-        """Get a random network delay"""
-        return random.uniform(self.delay_min, self.delay_max)
+    def _draw_decisions(self, n):
+        """Draw n (drop, corrupt, delay) decisions, each from one 64-bit random value
+        
+        The low 24 bits decide loss, the next 24 corruption and the top 16 bits
+        pick the delay, so the three fields are independent.
+        """
+        getrandbits = self._rng.getrandbits
+        drop_thr = int(self.loss_rate * 0x1000000)
+        corrupt_thr = int(self.corruption_rate * 0x1000000)
+        low, step = self.delay_min, (self.delay_max - self.delay_min) / 0xFFFF
+        decisions = []
+        for _ in range(n):
+            r = getrandbits(64)
+            decisions.append(((r & 0xFFFFFF) < drop_thr,
+                              (r >> 24 & 0xFFFFFF) < corrupt_thr,
+                              low + (r >> 48) * step))
+        return iter(decisions)
+    
+    def decide(self):
+        """Return the (drop, corrupt, delay) decision for the next packet"""
+        decision = next(self._decisions, None)
+        if decision is None:
+            self._decisions = self._draw_decisions(self.DRAW_BLOCK)
+            decision = next(self._decisions)
+        return decision
+
+
+# Last formatted wall-clock second, reused until the second changes
+_LAST_SEC = [0, ""]
+
+
+def _timestamp():
+    """Format the current time as HH:MM:SS.mmm, caching the per-second prefix"""
+    sec, ns = divmod(time.time_ns(), 1_000_000_000)
+    if sec != _LAST_SEC[0]:
+        _LAST_SEC[:] = [sec, time.strftime("%H:%M:%S", time.localtime(sec))]
+    return f"{_LAST_SEC[1]}.{ns // 1_000_000:03d}"
+
+
+def _ack_label(packet):
+    """Format an ACK's number, marking cumulative ACKs"""
+    return f"≤{packet.ack_number}" if packet.cumulative else str(packet.ack_number)
+
+
+def _printable(data):
+    """Decode a packet payload for display"""
+    return str(data, "utf-8", "replace")
+
+
+class _LogWriter:
+    """Buffers log lines and writes them to stdout in batches from a background thread"""
+    
+    def __init__(self):
+        self._lines = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def write(self, line):
+        """Queue a log line, starting the writer thread on first use"""
+        self._lines.put(line)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+    
+    def flush(self):
+        """Wait until every line queued so far has been written"""
+        if self._thread is None or not self._thread.is_alive():
+            return  # Nothing has been logged, or no writer is left to release the marker
+        done = threading.Event()
+        self._lines.put(done)
+        done.wait()
+    
+    def _run(self):
+        """Block for the next line, then write it with everything queued behind it"""
+        get, get_nowait = self._lines.get, self._lines.get_nowait
+        while True:
+            batch = [get()]
+            try:
+                while True:
+                    batch.append(get_nowait())
+            except queue.Empty:
+                pass
+            
+            # flush() markers are queued as Events and released once written
+            lines = [item for item in batch if isinstance(item, str)]
+            try:
+                if lines:
+                    sys.stdout.write("\n".join(lines) + "\n")
+                    sys.stdout.flush()
+            except (OSError, ValueError):
+                pass  # stdout is gone (broken pipe or closed); drop the lines but keep serving
+            finally:
+                for item in batch:
+                    if not isinstance(item, str):
+                        item.set()
+
+
+_log = _LogWriter()
+
+# Log line templates with their colors baked in, filled with % formatting
+_FMT_SENT_ACK = f"{Fore.CYAN}%s %s → ACK %s%s{Style.RESET_ALL}"
+_FMT_SENT_SEQ = f"{Fore.GREEN}%s %s → SEQ %d ['%s']%s{Style.RESET_ALL}"
+_FMT_RECEIVED_ACK = f"{Fore.BLUE}%s %s ← ACK %s{Style.RESET_ALL}"
+_FMT_RECEIVED_SEQ = f"{Fore.YELLOW}%s %s ← SEQ %d ['%s']{Style.RESET_ALL}"
+_FMT_DROPPED_ACK = f"{Fore.RED}%s ✗ DROPPED ACK %s{Style.RESET_ALL}"
+_FMT_DROPPED_SEQ = f"{Fore.RED}%s ✗ DROPPED SEQ %d{Style.RESET_ALL}"
+_FMT_CORRUPTED_ACK = f"{Fore.MAGENTA}%s %s ← CORRUPTED ACK{Style.RESET_ALL}"
+_FMT_CORRUPTED_SEQ = f"{Fore.MAGENTA}%s %s ← CORRUPTED SEQ %d{Style.RESET_ALL}"
+_FMT_TIMEOUT = f"{Fore.RED}%s %s ! TIMEOUT SEQ %d{Style.RESET_ALL}"
+_FMT_INFO = f"{Fore.WHITE}%s ℹ %s{Style.RESET_ALL}"
+_RETRANSMIT = " (RETRANSMIT)"
+atexit.register(_log.flush)
 
 
 class SimulationVisualizer:
@@ -106,55 +286,72 @@ class SimulationVisualizer:
         
     def log_sent_packet(self, sender, packet, is_retransmission=False):
         """Log sent packet"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.CYAN}{timestamp} {sender} → ACK {packet.ack_number}{' (RETRANSMIT)' if is_retransmission else ''}{Style.RESET_ALL}")
+            _log.write(_FMT_SENT_ACK % (timestamp, sender, _ack_label(packet), _RETRANSMIT if is_retransmission else ""))
         else:
-            print(f"{Fore.GREEN}{timestamp} {sender} → SEQ {packet.sequence} ['{packet.data}']{' (RETRANSMIT)' if is_retransmission else ''}{Style.RESET_ALL}")
+            _log.write(_FMT_SENT_SEQ % (timestamp, sender, packet.sequence, _printable(packet.data), _RETRANSMIT if is_retransmission else ""))
     
     def log_received_packet(self, receiver, packet):
         """Log received packet"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.BLUE}{timestamp} {receiver} ← ACK {packet.ack_number}{Style.RESET_ALL}")
+            _log.write(_FMT_RECEIVED_ACK % (timestamp, receiver, _ack_label(packet)))
         else:
-            print(f"{Fore.YELLOW}{timestamp} {receiver} ← SEQ {packet.sequence} ['{packet.data}']{Style.RESET_ALL}")
+            _log.write(_FMT_RECEIVED_SEQ % (timestamp, receiver, packet.sequence, _printable(packet.data)))
     
     def log_dropped_packet(self, packet):
         """Log dropped packet"""
         if not self.show_dropped:
             return
             
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.RED}{timestamp} ✗ DROPPED ACK {packet.ack_number}{Style.RESET_ALL}")
+            _log.write(_FMT_DROPPED_ACK % (timestamp, _ack_label(packet)))
         else:
-            print(f"{Fore.RED}{timestamp} ✗ DROPPED SEQ {packet.sequence}{Style.RESET_ALL}")
+            _log.write(_FMT_DROPPED_SEQ % (timestamp, packet.sequence))
     
     def log_corrupted_packet(self, receiver, packet):
         """Log corrupted packet"""
         if not self.show_corrupted:
             return
             
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = _timestamp()
         
         if packet.is_ack:
-            print(f"{Fore.MAGENTA}{timestamp} {receiver} ← CORRUPTED ACK{Style.RESET_ALL}")
+            _log.write(_FMT_CORRUPTED_ACK % (timestamp, receiver))
         else:
-            print(f"{Fore.MAGENTA}{timestamp} {receiver} ← CORRUPTED SEQ {packet.sequence}{Style.RESET_ALL}")
+            _log.write(_FMT_CORRUPTED_SEQ % (timestamp, receiver, packet.sequence))
     
     def log_timeout(self, sender, sequence):
         """Log timeout"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"{Fore.RED}{timestamp} {sender} ! TIMEOUT SEQ {sequence}{Style.RESET_ALL}")
+        timestamp = _timestamp()
+        _log.write(_FMT_TIMEOUT % (timestamp, sender, sequence))
     
     def log_info(self, message):
         """Log general information"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"{Fore.WHITE}{timestamp} ℹ {message}{Style.RESET_ALL}")
+        timestamp = _timestamp()
+        _log.write(_FMT_INFO % (timestamp, message))
+
+def flush_logs():
+    """Write out any log lines still buffered for the background writer"""
+    _log.flush()
+
+def tune_socket(sock, rcvbuf=SOCKET_BUFFER_SIZE, sndbuf=SOCKET_BUFFER_SIZE):
+    """Enlarge the socket buffers and disable path MTU discovery on Linux
+    
+    Returns the (rcvbuf, sndbuf) sizes actually granted, which the kernel caps
+    at net.core.rmem_max / wmem_max.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if sys.platform.startswith("linux"):
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DONT)
+    return (sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+            sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF))
 
 def print_simulation_header(args=None):
     """Print simulation parameters"""
@@ -173,6 +370,8 @@ def print_simulation_header(args=None):
             print(f"• Timeout: {args.timeout:.2f}s")
         if hasattr(args, 'retries'):
             print(f"• Max Retries: {args.retries}")
+        if hasattr(args, 'window'):
+            print(f"• Window Size: {args.window}")
         
     print(f"\n{Fore.WHITE}╔══════════════════════════════════════════════════╗")
     print(f"║                 SIMULATION LOG                   ║")
@@ -1,31 +1,51 @@
+import os
 import socket
 import argparse
 import sys
-import time
-import random
-import json
-from rudp_simulation import RUDPPacket, NetworkSimulator, SimulationVisualizer, print_simulation_header
+import asyncio
+from rudp_batch import BatchReceiver
+from rudp_simulation import _TYPE_DATA, RUDPPacket, NetworkSimulator, SimulationVisualizer, print_simulation_header, tune_socket, flush_logs, SOCKET_BUFFER_SIZE, WINDOW_SIZE
+
+# Linux value, for Python versions whose socket module does not export it
+SO_INCOMING_CPU = getattr(socket, "SO_INCOMING_CPU", 49)
+
+# How long in-order packets wait to be covered by one cumulative ACK
+DELAYED_ACK_TIMEOUT = 0.005
 
 class RUDPServer:
     """RUDP Server implementation using real sockets"""
     
     def __init__(self, host="0.0.0.0", port=5000, 
                  loss_rate=0.2, corruption_rate=0.1, 
-                 delay_min=0.05, delay_max=0.2):
+                 delay_min=0.05, delay_max=0.2, window_size=WINDOW_SIZE,
+                 rcvbuf=SOCKET_BUFFER_SIZE, sndbuf=SOCKET_BUFFER_SIZE, cpu=None,
+                 delayed_ack=True, verbose=True, reuseport=False):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        
         self.host = host
         self.port = port
         
         # Create a UDP socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        buffer_sizes = tune_socket(self.socket, rcvbuf, sndbuf)
+        
+        # Opt in to sharing the port between server processes; the kernel hashes each client to one
+        if reuseport and hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         
         try:
             self.socket.bind((host, port))
             self.visualizer = SimulationVisualizer()
             self.visualizer.log_info(f"Socket successfully bound to {host}:{port}")
+            self.visualizer.log_info("Socket buffers: SO_RCVBUF=%d, SO_SNDBUF=%d" % buffer_sizes)
         except Exception as e:
             print(f"Error binding socket: {str(e)}")
             sys.exit(1)
         
+        if cpu is not None:
+            self._pin_to_cpu(cpu)
+        
         # Setup network simulator for artificial conditions
         self.network = NetworkSimulator(loss_rate, corruption_rate, delay_min, delay_max)
         
@@ -34,110 +54,48 @@ class RUDPServer:
         self.received_data = []
         self.running = False
         self.clients = {}  # Track clients by address
+        self.window_size = window_size  # Out-of-order packets buffered per client
+        self.delayed_ack = delayed_ack  # Coalesce in-order ACKs into cumulative ACKs
+        self.verbose = verbose  # Log every packet, not just connection events and results
+        
+        # Event loop driving socket reads and simulated network delays
+        self._loop = None
+        
+        # Receive buffers are allocated once and reused for every datagram
+        self._receiver = BatchReceiver(self.socket)
+    
+    def _pin_to_cpu(self, cpu):
+        """Run on one CPU and ask the kernel to prefer this socket for packets handled there"""
+        try:
+            os.sched_setaffinity(0, {cpu})
+            self.socket.setsockopt(socket.SOL_SOCKET, SO_INCOMING_CPU, cpu)
+            self.visualizer.log_info(f"Pinned to CPU {cpu}")
+        except (AttributeError, OSError) as e:
+            self.visualizer.log_info(f"Could not pin to CPU {cpu}: {str(e)}")
     
     def start(self, duration=None):
         """Start the server and listen for incoming packets"""
         self.running = True
         self.visualizer.log_info(f"Server started on {self.host}:{self.port}")
         
-        start_time = time.time()
-        self.socket.settimeout(0.1)  # Short timeout for checking if we should stop
-        
-        while self.running:
-            if duration and time.time() - start_time > duration:
-                self.visualizer.log_info(f"Server stopping after {duration} seconds")
-                break
-                
-            try:
-                # Wait for data from client
-                json_data, client_address = self.socket.recvfrom(1024)
-                
-                # Process the packet
-                try:
-                    packet = RUDPPacket.from_json(json_data.decode())
-                    
-                    # Handle ping packet (used by client to check if server is reachable)
-                    if packet.data == "PING":
-                        self.visualizer.log_info(f"Received ping from {client_address[0]}:{client_address[1]}")
-                        # Send a pong response
-                        pong_packet = RUDPPacket(sequence=0, data="PONG", is_ack=False)
-                        self.socket.sendto(pong_packet.to_json().encode(), client_address)
-                        continue
-                    
-                    # Add client to tracking if not seen before
-                    if client_address not in self.clients:
-                        self.clients[client_address] = {
-                            "address": client_address,
-                            "expected_sequence": 0,
-                            "received_data": []
-                        }
-                        self.visualizer.log_info(f"New client connected: {client_address[0]}:{client_address[1]}")
-                    
-                    # Get client state
-                    client = self.clients[client_address]
-                    
-                    # Simulate network conditions
-                    if self.network.should_drop_packet():
-                        # Simulate packet loss
-                        self.visualizer.log_dropped_packet(packet)
-                        continue
-                    
-                    # Simulate network delay
-                    delay = self.network.get_delay()
-                    time.sleep(delay)
-                    
-                    # Simulate corruption
-                    if self.network.should_corrupt_packet():
-                        packet.checksum = random.randint(0, 65535)  # Corrupt the checksum
-                        self.visualizer.log_corrupted_packet("SERVER", packet)
-                        continue  # Discard corrupted packets
-                    
-                    # Log received packet
-                    self.visualizer.log_received_packet("SERVER", packet)
-                    
-                    # Verify packet integrity
-                    if not packet.verify_checksum():
-                        self.visualizer.log_corrupted_packet("SERVER", packet)
-                        continue
-                    
-                    # Process packet based on expected sequence
-                    if packet.sequence == client["expected_sequence"]:
-                        # This is the packet we're expecting
-                        client["received_data"].append(packet.data)
-                        
-                        # Send ACK
-                        self._send_ack(client_address, packet.sequence)
-                        
-                        # Update expected sequence
-                        client["expected_sequence"] += 1
-                        
-                    elif packet.sequence < client["expected_sequence"]:
-                        # This is a duplicate packet, still send ACK
-                        self.visualizer.log_info(f"Duplicate packet with SEQ {packet.sequence}, expected {client['expected_sequence']}")
-                        self._send_ack(client_address, packet.sequence)
-                    else:
-                        # Out of order packet, ignore for this simple implementation
-                        self.visualizer.log_info(f"Out of order packet with SEQ {packet.sequence}, expected {client['expected_sequence']}")
-                
-                except json.JSONDecodeError:
-                    self.visualizer.log_info(f"Received invalid JSON data from {client_address[0]}:{client_address[1]}")
-                except Exception as e:
-                    self.visualizer.log_info(f"Error processing packet: {str(e)}")
-                
-            except socket.timeout:
-                # Socket timeout - just continue the loop
-                continue
-            except (ConnectionResetError, ConnectionRefusedError) as e:
-                self.visualizer.log_info(f"Connection error: {str(e)}")
-                continue
-            except Exception as e:
-                self.visualizer.log_info(f"Error: {str(e)}")
-                continue
+        # Reactor: wake on socket readiness and on simulated network delay timers
+        self._loop = asyncio.SelectorEventLoop()
+        self.socket.setblocking(False)
+        self._loop.add_reader(self.socket.fileno(), self._on_readable)
+        if duration:
+            self._loop.call_later(duration, self._expire, duration)
+        
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.remove_reader(self.socket.fileno())
+            self._loop.close()
+            self.running = False
         
         # Print summary for all clients
         for addr, client in self.clients.items():
             if client["received_data"]:
-                received_message = "".join(client["received_data"])
+                received_message = b"".join(client["received_data"]).decode("utf-8", "replace")
                 self.visualizer.log_info(f"Received complete message from {addr[0]}:{addr[1]}: '{received_message}'")
         
         if not self.clients:
@@ -145,31 +103,178 @@ class RUDPServer:
         
         self.socket.close()
     
-    def _send_ack(self, client_address, sequence):
+    def _handle_datagram(self, data, client_address):
+        """Handle a datagram as it comes off the socket"""
+        try:
+            # Add client to tracking if not seen before
+            client = self.clients.get(client_address)
+            if client is None:
+                client = self.clients[client_address] = {
+                    "address": client_address,
+                    "expected_sequence": 0,
+                    "received_data": [],
+                    # Ring buffer of out-of-order payloads indexed by sequence % window_size
+                    "window": [None] * self.window_size,
+                    "present": bytearray(self.window_size),
+                    "ack_pending": False
+                }
+                self.visualizer.log_info(f"New client connected: {client_address[0]}:{client_address[1]}")
+            
+            # Simulate network conditions
+            drop, corrupt, delay = self.network.decide()
+            if drop:
+                # Simulate packet loss
+                if self.verbose:
+                    self.visualizer.log_dropped_packet(RUDPPacket.from_bytes(data))
+                return
+            
+            # Simulate network delay; the packet is processed once it arrives
+            self._schedule(delay, self._deliver, client, RUDPPacket.from_bytes(data), corrupt)
+            
+        except Exception as e:
+            self.visualizer.log_info(f"Error processing packet: {str(e)}")
+    
+    def _deliver(self, client, packet, corrupt):
+        """Process a data packet once its simulated network delay has elapsed"""
+        client_address = client["address"]
+        
+        verbose = self.verbose
+        
+        # Simulate corruption
+        if corrupt:
+            packet.checksum ^= 1  # Corrupt the checksum
+            if verbose:
+                self.visualizer.log_corrupted_packet("SERVER", packet)
+            return  # Discard corrupted packets
+        
+        # Log received packet
+        if verbose:
+            self.visualizer.log_received_packet("SERVER", packet)
+        
+        # Packet integrity was verified when it was parsed
+        if packet.is_corrupted:
+            if verbose:
+                self.visualizer.log_corrupted_packet("SERVER", packet)
+            return
+        
+        # Only data packets may reach the receive window; ACKs and unknown types are dropped
+        if packet.packet_type != _TYPE_DATA:
+            if verbose:
+                self.visualizer.log_info(f"Dropped packet of unexpected type 0x{packet.packet_type:02x} from {client_address[0]}:{client_address[1]}")
+            return
+        
+        # Process packet based on expected sequence
+        expected = client["expected_sequence"]
+        if packet.sequence == expected:
+            # This is the packet we're expecting
+            received_data = client["received_data"]
+            received_data.append(packet.data)
+            
+            # Send ACK, or let a cumulative ACK cover it shortly
+            if self.delayed_ack:
+                self._delay_ack(client)
+            else:
+                self._send_ack(client_address, packet.sequence)
+            
+            # Update expected sequence, flushing any buffered packets that are now in order
+            window, present = client["window"], client["present"]
+            expected += 1
+            slot = expected % self.window_size
+            while present[slot]:
+                received_data.append(window[slot])
+                window[slot] = None
+                present[slot] = 0
+                expected += 1
+                slot = expected % self.window_size
+            client["expected_sequence"] = expected
+            
+        elif packet.sequence < expected:
+            # This is a duplicate packet, still send ACK
+            if verbose:
+                self.visualizer.log_info(f"Duplicate packet with SEQ {packet.sequence}, expected {expected}")
+            self._send_ack(client_address, packet.sequence)
+        elif packet.sequence >= expected + self.window_size:
+            # Beyond the receive window, the sender will retransmit it later
+            if verbose:
+                self.visualizer.log_info(f"Packet with SEQ {packet.sequence} beyond receive window, expected {expected}")
+        else:
+            # Out of order packet, buffer it until the gap is filled
+            if verbose:
+                self.visualizer.log_info(f"Out of order packet with SEQ {packet.sequence}, expected {expected}")
+            slot = packet.sequence % self.window_size
+            client["window"][slot] = packet.data
+            client["present"][slot] = 1
+            self._send_ack(client_address, packet.sequence)
+    
+    def _expire(self, duration):
+        """Stop the event loop once the requested runtime has elapsed"""
+        self.visualizer.log_info(f"Server stopping after {duration} seconds")
+        self._loop.stop()
+    
+    def _on_readable(self):
+        """Drain every queued datagram with a single syscall where supported"""
+        try:
+            for data, client_address in self._receiver.recv():
+                self._handle_datagram(data, client_address)
+        except (ConnectionResetError, ConnectionRefusedError) as e:
+            self.visualizer.log_info(f"Connection error: {str(e)}")
+        except Exception as e:
+            self.visualizer.log_info(f"Error: {str(e)}")
+    
+    def _schedule(self, delay, callback, *args):
+        """Run a callback once a simulated network delay has elapsed"""
+        self._loop.call_later(delay, self._run_event, callback, args)
+    
+    def _run_event(self, callback, args):
+        """Run a scheduled callback, logging rather than propagating its errors"""
+        try:
+            callback(*args)
+        except Exception as e:
+            self.visualizer.log_info(f"Error processing packet: {str(e)}")
+    
+    def _delay_ack(self, client):
+        """Arrange for a cumulative ACK unless one is already pending"""
+        if not client["ack_pending"]:
+            client["ack_pending"] = True
+            self._schedule(DELAYED_ACK_TIMEOUT, self._flush_ack, client)
+    
+    def _flush_ack(self, client):
+        """Acknowledge every packet delivered in order so far with one ACK"""
+        client["ack_pending"] = False
+        self._send_ack(client["address"], client["expected_sequence"] - 1, cumulative=True)
+    
+    def _send_ack(self, client_address, sequence, cumulative=False):
         """Send acknowledgment for a sequence number"""
-        ack_packet = RUDPPacket(is_ack=True, ack_number=sequence)
+        ack_packet = RUDPPacket(is_ack=True, ack_number=sequence, cumulative=cumulative)
         
         # Log sent ACK
-        self.visualizer.log_sent_packet("SERVER", ack_packet)
+        if self.verbose:
+            self.visualizer.log_sent_packet("SERVER", ack_packet)
         
         # Simulate packet loss for ACK
-        if self.network.should_drop_packet():
-            self.visualizer.log_dropped_packet(ack_packet)
+        drop, _, delay = self.network.decide()
+        if drop:
+            if self.verbose:
+                self.visualizer.log_dropped_packet(ack_packet)
             return
             
         # Simulate network delay for ACK
-        delay = self.network.get_delay()
-        time.sleep(delay)
-        
-        # Send the ACK
+        self._schedule(delay, self._sendto, ack_packet.to_bytes(), client_address)
+    
+    def _sendto(self, data, client_address):
+        """Send a datagram to a client"""
         try:
-            self.socket.sendto(ack_packet.to_json().encode(), client_address)
+            self.socket.sendto(data, client_address)
         except Exception as e:
             self.visualizer.log_info(f"Error sending ACK: {str(e)}")
     
     def stop(self):
         """Stop the server"""
         self.running = False
+        if self._loop is not None and self._loop.is_running():
+            # start() closes the socket once its loop has wound down
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            return
         try:
             self.socket.close()
         except:
@@ -185,8 +290,21 @@ def main():
     parser.add_argument("--delay-min", type=float, default=0.05, help="Minimum network delay in seconds")
     parser.add_argument("--delay-max", type=float, default=0.2, help="Maximum network delay in seconds")
     parser.add_argument("--duration", type=int, default=60, help="Server runtime in seconds")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE,
+                        help="Receive window size for out-of-order packets; must be at least the client's --window")
+    parser.add_argument("--rcvbuf", type=int, default=SOCKET_BUFFER_SIZE, help="Socket receive buffer size in bytes")
+    parser.add_argument("--sndbuf", type=int, default=SOCKET_BUFFER_SIZE, help="Socket send buffer size in bytes")
+    parser.add_argument("--no-delayed-ack", dest="delayed_ack", action="store_false",
+                        help="ACK every in-order packet immediately instead of coalescing cumulative ACKs")
+    parser.add_argument("--quiet", dest="verbose", action="store_false",
+                        help="Only log connection events and results, not every packet")
+    parser.add_argument("--cpu", type=int, default=None, help="Pin the server and its socket to this CPU (Linux)")
+    parser.add_argument("--reuseport", action="store_true",
+                        help="Set SO_REUSEPORT so several server processes can share the port")
     
     args = parser.parse_args()
+    if args.window < 1:
+        parser.error("--window must be at least 1")
     
     # Print simulation parameters
     print_simulation_header(args)
@@ -198,12 +316,20 @@ def main():
         loss_rate=args.loss_rate,
         corruption_rate=args.corruption_rate,
         delay_min=args.delay_min,
-        delay_max=args.delay_max
+        delay_max=args.delay_max,
+        window_size=args.window,
+        rcvbuf=args.rcvbuf,
+        sndbuf=args.sndbuf,
+        cpu=args.cpu,
+        delayed_ack=args.delayed_ack,
+        verbose=args.verbose,
+        reuseport=args.reuseport
     )
     
     try:
         server.start(duration=args.duration)
     except KeyboardInterrupt:
+        flush_logs()
         print(f"\nServer interrupted by user")
     finally:
         server.stop()